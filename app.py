@@ -1,14 +1,24 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+import numpy as np
 import pulp
 import time
-from datetime import datetime, timedelta, timezone
+import os
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
 import math
+from collections import defaultdict
 import sqlite3
 import json
 import socket
 import re # Added for regex extraction
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import random # Added for random monkey selection
 
 # --- OPTIONAL: FIREBASE ADMIN FOR CLOUD LOGGING ---
@@ -19,6 +29,28 @@ try:
 except ImportError:
     FIREBASE_AVAILABLE = False
 
+# --- OPTIONAL: GEOIP2 FOR OFFLINE IP LOOKUPS ---
+try:
+    import geoip2.database
+    import geoip2.errors
+    GEOIP_AVAILABLE = True
+except ImportError:
+    GEOIP_AVAILABLE = False
+
+# --- OPTIONAL: HIGHSPY FOR THE IN-PROCESS HIGHS SOLVER ---
+try:
+    import highspy
+    HIGHSPY_AVAILABLE = True
+except ImportError:
+    HIGHSPY_AVAILABLE = False
+
+# --- OPTIONAL: ORJSON FOR FASTER API DECODING ---
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # --- CONFIGURATION ---
 BASE_URL = "https://nbafantasy.nba.com/api"
 DEFAULT_TEAM_ID = 1
@@ -29,11 +61,22 @@ MAX_PLAYERS_PER_TEAM = 2
 TRANSFERS_ALLOWED = 2
 ROSTER_SIZE = 10
 
+GAMEWEEK_RE = re.compile(r'Gameweek\s*(\d+)') # Phase names look like "Gameweek 5"
+
+LOCAL_DB_PATH = 'nba_fantasy_logs.db'
+GEOIP_DB_PATH = 'GeoLite2-City.mmdb' # Optional MaxMind database; ip-api.com is used when it's absent
+LOG_PAGE_SIZE = 500 # Admin log history rows fetched per page
+
+SOLVER_TIME_LIMIT = 60 # seconds; HiGHS returns its best incumbent when the limit is hit
+SOLVER_GAP_REL = 0.001 # EV inputs are noisy estimates, a 0.1% optimality gap is plenty
+
 st.set_page_config(page_title="NBA Fantasy Optimizer", layout="wide", page_icon="🏀")
 
 # --- DATABASE & LOGGING FUNCTIONS ---
 
+@st.cache_resource(show_spinner=False)
 def get_firestore_db():
+    # One client per process; credentials are parsed and the app initialised only on first use
     if not FIREBASE_AVAILABLE: return None
     if "firebase" not in st.secrets: return None
     try:
@@ -54,24 +97,47 @@ def get_remote_ip():
     except Exception: pass
     return "Unknown/Local"
 
-def get_ip_location(ip):
+@st.cache_resource(show_spinner=False)
+def get_geoip_reader():
+    if not GEOIP_AVAILABLE or not os.path.exists(GEOIP_DB_PATH): return None
+    return geoip2.database.Reader(GEOIP_DB_PATH)
+
+@st.cache_data(ttl=86400, max_entries=4096, show_spinner=False)
+def lookup_ip_location(ip):
+    # Failures raise so they aren't cached; get_ip_location falls back for this call only
     if ip in ["Unknown/Local", "127.0.0.1", "localhost", "::1"]: return "Localhost"
-    try:
-        response = requests.get(f"http://ip-api.com/json/{ip}", timeout=2)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('status') == 'success':
-                return f"{data.get('city')}, {data.get('regionName')}, {data.get('country')}"
-    except: pass
-    return "Unknown Location"
+    reader = get_geoip_reader()
+    if reader:
+        try:
+            r = reader.city(ip)
+            parts = [n for n in (r.city.name, r.subdivisions.most_specific.name, r.country.name) if n] # GeoLite2 leaves unknown names as None
+            if parts: return ", ".join(parts)
+        except (geoip2.errors.AddressNotFoundError, ValueError): pass
+    # Second tier: resolved locations persist in the local DB so restarts don't re-hit ip-api.com
+    conn, lock = get_local_db()
+    with lock:
+        row = conn.execute("SELECT location FROM ip_cache WHERE ip=?", (ip,)).fetchone()
+    if row: return row[0]
+    response = get_http_session().get(f"http://ip-api.com/json/{ip}", timeout=2)
+    response.raise_for_status()
+    data = response.json()
+    if data.get('status') != 'success': raise requests.exceptions.RequestException(f"No location for {ip}")
+    loc = f"{data.get('city')}, {data.get('regionName')}, {data.get('country')}"
+    with local_db_transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO ip_cache (ip, location, cached_at) VALUES (?, ?, ?)", (ip, loc, int(time.time())))
+    return loc
+
+def get_ip_location(ip):
+    try: return lookup_ip_location(ip)
+    except (requests.exceptions.RequestException, ValueError): return "Unknown Location"
+
+PACIFIC_TZ = ZoneInfo("America/Los_Angeles")
 
 def get_pst_time():
-    utc = datetime.utcnow()
-    pst = utc - timedelta(hours=8)
-    return pst.strftime("%Y-%m-%d %H:%M:%S PST")
+    # %Z gives PST or PDT, so log timestamps stay right across daylight saving
+    return datetime.now(PACIFIC_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
 
-def init_local_db():
-    conn = sqlite3.connect('nba_fantasy_logs.db')
+def init_local_db(conn):
     c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS logs (
@@ -96,126 +162,224 @@ def init_local_db():
     if 'location' not in cols: c.execute("ALTER TABLE logs ADD COLUMN location TEXT")
     if 'transfers' not in cols: c.execute("ALTER TABLE logs ADD COLUMN transfers TEXT")
     if 'user_options' not in cols: c.execute("ALTER TABLE logs ADD COLUMN user_options TEXT")
-    conn.commit()
-    conn.close()
+    c.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs(timestamp)")
+    c.execute("CREATE TABLE IF NOT EXISTS ip_cache (ip TEXT PRIMARY KEY, location TEXT, cached_at INTEGER)")
+    c.execute("CREATE TABLE IF NOT EXISTS player_avg_cache (pid INTEGER PRIMARY KEY, avg REAL, fetched_at INTEGER)")
+
+@st.cache_resource(show_spinner=False)
+def get_local_db():
+    # One autocommit connection per process; WAL + NORMAL sync avoid an fsync per log write.
+    # Schema setup/migration runs once here instead of on every log call.
+    conn = sqlite3.connect(LOCAL_DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA busy_timeout=5000") # wait out writers in other processes instead of failing with SQLITE_BUSY
+    init_local_db(conn)
+    return conn, threading.Lock()
+
+@contextmanager
+def local_db_transaction():
+    conn, lock = get_local_db()
+    with lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+@st.cache_resource(show_spinner=False)
+def get_log_writer():
+    # Single worker keeps log writes in submission order (a run's END update must land after its START)
+    return ThreadPoolExecutor(max_workers=1)
+
+def run_in_background(fn):
+    # Logging is fire-and-forget so the IP lookup and DB round-trips stay off the Run path; failures are dropped
+    def _run():
+        try: return fn()
+        except Exception: return None
+    return get_log_writer().submit(_run)
 
 def log_simulation_start(team_id, gw, weeks, options_dict):
     ts = get_pst_time()
     ip = get_remote_ip()
-    loc = get_ip_location(ip)
     options_str = json.dumps(options_dict)
     
     db = get_firestore_db()
     if db:
+        # Firestore document IDs are generated client-side, so the ID can be returned before the write lands
         doc_ref = db.collection("logs").document()
-        doc_ref.set({
-            "timestamp": ts, "ip_address": ip, "location": loc,
+        run_in_background(lambda: doc_ref.set({
+            "timestamp": ts, "ip_address": ip, "location": get_ip_location(ip),
             "team_id": team_id, "gameweek": gw, "weeks_planned": weeks,
             "user_options": options_str,
             "status": "STARTED", "created_at": firestore.SERVER_TIMESTAMP
-        })
+        }))
         return doc_ref.id
     else:
-        init_local_db()
-        conn = sqlite3.connect('nba_fantasy_logs.db')
-        c = conn.cursor()
-        c.execute("INSERT INTO logs (timestamp, ip_address, location, team_id, gameweek, weeks_planned, user_options, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (ts, ip, loc, team_id, gw, weeks, options_str, 'STARTED'))
-        log_id = c.lastrowid
-        conn.commit()
-        conn.close()
-        return log_id
+        def _write():
+            loc = get_ip_location(ip)
+            with local_db_transaction() as conn:
+                c = conn.execute("INSERT INTO logs (timestamp, ip_address, location, team_id, gameweek, weeks_planned, user_options, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (ts, ip, loc, team_id, gw, weeks, options_str, 'STARTED'))
+                return c.lastrowid
+        # The row id only exists once the insert has run; log_simulation_end resolves it on the same worker
+        return run_in_background(_write)
 
 def log_simulation_end(log_id, status, duration, error_msg=None, result_summary=None, transfers=None):
     db = get_firestore_db()
     if db:
         if log_id:
-            db.collection("logs").document(str(log_id)).update({
+            # Same single-thread worker as the START write, so the update always lands after the document exists
+            run_in_background(lambda: db.collection("logs").document(str(log_id)).update({
                 "status": status, "duration_sec": duration,
                 "error_msg": error_msg if error_msg else "",
                 "result_summary": result_summary if result_summary else "",
                 "transfers": transfers if transfers else ""
-            })
+            }))
     else:
-        conn = sqlite3.connect('nba_fantasy_logs.db')
-        c = conn.cursor()
-        c.execute("UPDATE logs SET status=?, duration_sec=?, error_msg=?, result_summary=?, transfers=? WHERE id=?",
-            (status, duration, error_msg, result_summary, transfers, log_id))
-        conn.commit()
-        conn.close()
-
-def get_all_logs():
+        def _write():
+            row_id = log_id.result() if isinstance(log_id, Future) else log_id
+            with local_db_transaction() as conn:
+                conn.execute("UPDATE logs SET status=?, duration_sec=?, error_msg=?, result_summary=?, transfers=? WHERE id=?",
+                    (status, duration, error_msg, result_summary, transfers, row_id))
+        run_in_background(_write)
+
+def get_logs_page(cursor=None, since=None):
+    # One page of logs, newest first; returns (df, cursor for the next page or None when exhausted).
+    # `since` (a date, Pacific time like the log timestamps) is applied in the query, not after download.
     db = get_firestore_db()
     if db:
         try:
-            docs = db.collection("logs").order_by("created_at", direction=firestore.Query.DESCENDING).stream()
+            query = db.collection("logs")
+            if since is not None: query = query.where("created_at", ">=", datetime(since.year, since.month, since.day, tzinfo=PACIFIC_TZ))
+            query = query.order_by("created_at", direction=firestore.Query.DESCENDING).limit(LOG_PAGE_SIZE)
+            if cursor is not None: query = query.start_after(cursor)
+            docs = list(query.stream())
             data = []
             for doc in docs:
                 d = doc.to_dict()
                 d['id'] = doc.id
                 if 'created_at' in d and d['created_at']:
                     if 'timestamp' not in d: d['timestamp'] = d['created_at'].strftime("%Y-%m-%d %H:%M:%S")
+                d['date_group'] = str(d['timestamp'])[:10] if d.get('timestamp') else "Unknown"
                 data.append(d)
-            return pd.DataFrame(data)
-        except Exception: return pd.DataFrame()
+            return pd.DataFrame(data), (docs[-1] if len(docs) == LOG_PAGE_SIZE else None)
+        except Exception: return pd.DataFrame(), None
     else:
-        init_local_db()
-        conn = sqlite3.connect('nba_fantasy_logs.db')
-        df = pd.read_sql_query("SELECT * FROM logs ORDER BY id DESC", conn)
-        conn.close()
-        return df
+        conn, lock = get_local_db()
+        conditions, params = [], []
+        if cursor is not None: conditions.append("id < ?"); params.append(cursor)
+        if since is not None: conditions.append("timestamp >= ?"); params.append(since.strftime("%Y-%m-%d"))
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with lock:
+            df = pd.read_sql_query(f"SELECT *, COALESCE(NULLIF(substr(timestamp, 1, 10), ''), 'Unknown') AS date_group FROM logs {where}ORDER BY id DESC LIMIT ?", conn, params=(*params, LOG_PAGE_SIZE))
+        return df, (int(df['id'].iloc[-1]) if len(df) == LOG_PAGE_SIZE else None)
 
 # --- CORE FETCHING FUNCTIONS ---
 
+@st.cache_resource(show_spinner=False)
+def get_http_session():
+    # Shared across reruns so keep-alive connections (and TLS handshakes) are reused
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
 def fetch_json(url):
     try:
-        response = requests.get(url)
+        response = get_http_session().get(url, timeout=10)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException:
+        # bootstrap is ~1MB, where orjson decodes several times faster than the stdlib
+        return orjson.loads(response.content) if ORJSON_AVAILABLE else response.json()
+    except (requests.exceptions.RequestException, ValueError):
         return None
 
-@st.cache_data(ttl=3600)
+@st.cache_data(ttl=3600, show_spinner=False)
 def fetch_bootstrap():
     return fetch_json(f"{BASE_URL}/bootstrap-static/")
 
-@st.cache_data(ttl=3600)
+@st.cache_data(ttl=3600, show_spinner=False)
 def fetch_fixtures():
     return fetch_json(f"{BASE_URL}/fixtures/")
 
-def get_gameweek_event_range(bootstrap, gameweek):
-    phases = bootstrap.get('phases', [])
-    target_phase = None
-    # We look for the phase whose START EVENT ID matches the provided Gameweek
-    # since GWs are numbered by their starting event ID in this API
+def build_phase_index(phases):
+    # Gameweek number -> phase, built once per run. GWs are numbered by their starting event ID in this API,
+    # so the strict "Gameweek N" name match wins and start_event is the fallback.
+    by_name, by_start = {}, {}
     for phase in phases:
         try:
-            # Use strict name match first
             if 'Gameweek' in phase['name']:
-                match = re.search(r'Gameweek\s*(\d+)', phase['name'])
-                if match and int(match.group(1)) == gameweek:
-                    target_phase = phase
-                    break
+                match = GAMEWEEK_RE.search(phase['name'])
+                if match: by_name.setdefault(int(match.group(1)), phase)
         except (ValueError, IndexError, TypeError):
-            continue
-            
-    if not target_phase: 
-        # Fallback if Phase name parsing fails, use start_event ID search
-        for phase in phases:
-            if phase['start_event'] == gameweek:
-                target_phase = phase
-                break
-        
+            pass
+        by_start.setdefault(phase['start_event'], phase)
+    return {**by_start, **by_name}
+
+def get_gameweek_event_range(phase_index, gameweek):
+    target_phase = phase_index.get(gameweek)
     if not target_phase: return []
     return list(range(target_phase['start_event'], target_phase['stop_event'] + 1))
 
-def fetch_picks(team_id, event_id):
-    url = f"{BASE_URL}/entry/{team_id}/event/{event_id}/picks/"
-    data = fetch_json(url)
+def build_event_dates(gw_fixtures, event_ids, missing):
+    # Date of each event's first listed fixture; events without fixtures get the 'missing' marker
+    first_kickoff = gw_fixtures.groupby('event')['kickoff_time'].first().str[:10].to_dict()
+    return {eid: first_kickoff.get(eid, missing) for eid in event_ids}
+
+def build_reference_data(bootstrap):
+    elements = pd.DataFrame(bootstrap['elements'])
+    teams = pd.DataFrame(bootstrap['teams'])
+    element_types = pd.DataFrame(bootstrap['element_types'])
+
+    team_map = pd.Series(teams.name.values, index=teams.id).to_dict()
+    if 'short_name' in teams.columns:
+        team_short_map = pd.Series(teams.short_name.values, index=teams.id).to_dict()
+    else:
+        team_short_map = pd.Series(teams.name.str[:3].str.upper().values, index=teams.id).to_dict()
+    pos_map = pd.Series(element_types.singular_name.values, index=element_types.id).to_dict()
+
+    elements['team_name'] = elements['team'].map(team_map)
+    elements['team_short'] = elements['team'].map(team_short_map)
+    elements['position_name'] = elements['element_type'].map(pos_map)
+    elements['full_name'] = elements['first_name'] + " " + elements['second_name']
+
+    return {
+        'elements': elements, 'teams': teams,
+        'active_players': elements[elements['status'] != 'u'].copy(),
+        'phase_index': build_phase_index(bootstrap.get('phases', [])),
+        'finished_event_ids': frozenset(e['id'] for e in bootstrap.get('events', []) if e.get('finished')),
+        # Flat id -> field lookups (over all elements, so 'u' players on a roster still resolve)
+        'now_cost_by_id': dict(zip(elements['id'], elements['now_cost'])),
+        'web_name_by_id': dict(zip(elements['id'], elements['web_name'])),
+        'team_short_by_id': dict(zip(elements['id'], elements['team_short'])),
+        'team_by_id': dict(zip(elements['id'], elements['team'])),
+        'position_by_id': dict(zip(elements['id'], elements['position_name'])),
+    }
+
+@st.cache_data(ttl=86400, max_entries=500, show_spinner=False)
+def fetch_finished_picks(team_id, event_id):
+    # Picks and points of a finished event no longer change. Failures raise so they aren't cached.
+    data = fetch_json(f"{BASE_URL}/entry/{team_id}/event/{event_id}/picks/")
+    if not data: raise requests.exceptions.RequestException(f"No picks for event {event_id}")
+    return data
+
+def fetch_event_picks(team_id, event_id, finished_event_ids):
+    if event_id in finished_event_ids:
+        try: return fetch_finished_picks(team_id, event_id)
+        except requests.exceptions.RequestException: return None
+    return fetch_json(f"{BASE_URL}/entry/{team_id}/event/{event_id}/picks/")
+
+def fetch_picks(team_id, event_id, finished_event_ids=frozenset()):
+    data = fetch_event_picks(team_id, event_id, finished_event_ids)
     
     # If the exact event_id fails, try the previous one (robust fallback)
     if not data and event_id > 1:
-        data = fetch_json(f"{BASE_URL}/entry/{team_id}/event/{event_id - 1}/picks/")
+        data = fetch_event_picks(team_id, event_id - 1, finished_event_ids)
         
     if not data or 'picks' not in data:
         # Return empty structure if fetching fails completely
@@ -229,13 +393,28 @@ def calculate_selling_price(purchase_price, now_cost):
     fee = math.ceil(profit / 2)
     return now_cost - fee
 
-@st.cache_data(ttl=86400)
-def get_player_history_avg(player_id):
-    url = f"{BASE_URL}/element-summary/{player_id}/"
-    data = fetch_json(url)
-    if not data: return 0.0
+@st.cache_data(ttl=86400, max_entries=2000, show_spinner=False)
+def fetch_element_summary(player_id, today_str):
+    # Shared by the form average and the per-date scores, so each player's summary is downloaded once a day.
+    # Keyed by today_str so newly finished days show up; failures raise so they aren't cached.
+    data = fetch_json(f"{BASE_URL}/element-summary/{player_id}/")
+    if not data: raise requests.exceptions.RequestException(f"No summary for player {player_id}")
+    return data
+
+@st.cache_data(ttl=86400, max_entries=2000, show_spinner=False)
+def get_player_history_avg(player_id, today_str):
+    # Disk tier survives restarts; a NULL avg is a cached "inactive" result, not a miss
+    conn, lock = get_local_db()
+    with lock:
+        row = conn.execute("SELECT avg, fetched_at FROM player_avg_cache WHERE pid=?", (int(player_id),)).fetchone()
+    if row and time.time() - row[1] < 86400: return row[0]
+    avg = compute_history_avg(fetch_element_summary(player_id, today_str), today_str)
+    with local_db_transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO player_avg_cache (pid, avg, fetched_at) VALUES (?, ?, ?)", (int(player_id), avg, int(time.time())))
+    return avg
+
+def compute_history_avg(data, today_str):
     history = data.get('history', [])
-    today_str = datetime.utcnow().strftime("%Y-%m-%d")
     history = [h for h in history if h['kickoff_time'][:10] < today_str]
     history.sort(key=lambda x: x['kickoff_time'], reverse=True)
     if len(history) >= 2:
@@ -248,30 +427,267 @@ def get_player_history_avg(player_id):
     total_points = sum(g['total_points'] for g in last_5)
     return total_points / len(last_5)
 
-def get_player_score_for_date(player_id, target_date):
-    url = f"{BASE_URL}/element-summary/{player_id}/"
-    data = fetch_json(url)
-    if not data: return 0
-    history = data.get('history', [])
-    for h in history:
-        if h['kickoff_time'].startswith(target_date):
-            return h['total_points']
-    return 0
+@st.cache_data(ttl=86400, max_entries=2000, show_spinner=False)
+def get_player_scores_by_date(player_id, today_str):
+    data = fetch_element_summary(player_id, today_str)
+    scores = {}
+    for h in data.get('history', []):
+        # Keep the first game listed for a date, as the old per-date scan did
+        scores.setdefault(h['kickoff_time'][:10], h['total_points'])
+    return scores
+
+def get_player_scores_or_empty(player_id, today_str):
+    # A failed fetch isn't cached, so it only blanks this run's scores
+    try: return get_player_scores_by_date(player_id, today_str)
+    except requests.exceptions.RequestException: return {}
 
 # --- NBA CUP PROBABILITY HELPERS ---
-def get_win_probability(team1_id, team2_id, teams_df):
-    try:
-        t1 = teams_df[teams_df['id'] == team1_id].iloc[0]
-        t2 = teams_df[teams_df['id'] == team2_id].iloc[0]
-        w1, l1 = t1.get('win', 0), t1.get('loss', 0)
-        w2, l2 = t2.get('win', 0), t2.get('loss', 0)
-        total1 = w1 + l1
-        rate1 = w1 / total1 if total1 > 0 else 0.5
-        total2 = w2 + l2
-        rate2 = w2 / total2 if total2 > 0 else 0.5
-        if rate1 + rate2 == 0: return 0.5
-        return rate1 / (rate1 + rate2)
-    except: return 0.5
+def build_team_win_rates(teams_df):
+    # id -> win rate (0.5 before any games), built once instead of masking teams_df per matchup
+    zeros = pd.Series(0, index=teams_df.index)
+    wins, losses = teams_df.get('win', zeros), teams_df.get('loss', zeros)
+    total = wins + losses
+    rates = (wins / total.where(total > 0)).fillna(0.5)
+    return dict(zip(teams_df['id'], rates))
+
+def get_win_probability(team1_id, team2_id, win_rates):
+    rate1, rate2 = win_rates.get(team1_id), win_rates.get(team2_id)
+    if rate1 is None or rate2 is None: return 0.5
+    if rate1 + rate2 == 0: return 0.5
+    return rate1 / (rate1 + rate2)
+
+# --- SOLVER HELPERS ---
+def solution_values(var_dict, player_idx, num_days):
+    # Snapshot solved (pid, d_idx) values into a (days x players) matrix; missing vars read as 0
+    vals = np.zeros((num_days, len(player_idx)), dtype=np.float32)
+    for (pid, d_idx), var in var_dict.items():
+        vals[d_idx, player_idx[pid]] = var.varValue or 0.0
+    return vals
+
+def solution_matrix(var_dict, player_idx, num_days):
+    return solution_values(var_dict, player_idx, num_days) > 0.5
+
+def captain_matrix(captain_vars, player_idx, num_days, week_day_idx):
+    # Captain vars are continuous, so a tie between equal-EP starters may come back split;
+    # keep the single largest (day, player) entry of each week
+    vals = solution_values(captain_vars, player_idx, num_days)
+    caps = np.zeros(vals.shape, dtype=bool)
+    for days in week_day_idx:
+        if not days: continue
+        block = vals[days]
+        d, i = np.unravel_index(block.argmax(), block.shape)
+        if block[d, i] > 1e-6: caps[days[d], i] = True
+    return caps
+
+class WarmStartHiGHS(pulp.HiGHS):
+    # pulp.HiGHS ignores setInitialValue(); hand the initial values to highspy as a MIP start instead
+    def __init__(self, warm_start=False, **kwargs):
+        super().__init__(**kwargs)
+        self.warm_start = warm_start
+
+    def buildSolverModel(self, lp):
+        super().buildSolverModel(lp)
+        if not self.warm_start: return
+        start = highspy.HighsSolution()
+        start.col_value = [var.varValue or 0.0 for var in lp.variables()] # column i is lp.variables()[i]
+        start.value_valid = True
+        lp.solverModel.setSolution(start)
+
+def get_solver(warm_start=False):
+    # Prefer HiGHS (parallel branch-and-cut, stronger presolve) and fall back to PuLP's bundled CBC
+    cpu = os.cpu_count() or 1 # os.cpu_count() may return None
+    highs_opts = dict(msg=False, threads=cpu, timeLimit=SOLVER_TIME_LIMIT, gapRel=SOLVER_GAP_REL)
+    solver = pulp.HiGHS_CMD(warmStart=warm_start, **highs_opts)
+    if solver.available(): return solver
+    if HIGHSPY_AVAILABLE: return WarmStartHiGHS(warm_start=warm_start, **highs_opts) # highspy bindings, no CLI binary needed
+    return pulp.PULP_CBC_CMD(msg=0, warmStart=warm_start, threads=max(1, cpu - 1), timeLimit=SOLVER_TIME_LIMIT,
+                             gapRel=SOLVER_GAP_REL, presolve=True, cuts=True)
+
+def greedy_starters(ep, game_prob, is_bc, roster_mask):
+    # Heuristic lineup for a fixed roster: best EP first, at most 5 starters and 3 per court each day
+    starters = np.zeros(game_prob.shape, dtype=bool)
+    order = np.argsort(-ep, kind='stable')
+    for d_idx in range(game_prob.shape[1]):
+        n_bc = n_fc = 0
+        for p_i in order:
+            if not roster_mask[p_i] or game_prob[p_i, d_idx] <= 0: continue
+            if is_bc[p_i]:
+                if n_bc == 3: continue
+                n_bc += 1
+            else:
+                if n_fc == 3: continue
+                n_fc += 1
+            starters[p_i, d_idx] = True
+            if n_bc + n_fc == 5: break
+    return starters
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def build_lp_model(model_key, _m):
+    # model_key is a digest of _m, so Streamlit never hashes the bulky inputs itself.
+    # Callers solve a prob.copy() under 'lock' since the variables are shared between sessions.
+    players_data = _m['players_data']
+    game_prob_mat = _m['game_prob_mat']
+    num_future_days = game_prob_mat.shape[1]
+    my_player_ids = _m['my_player_ids']
+    forced_drop_ids, forced_add_ids, forced_keep_ids = _m['forced_drop_ids'], _m['forced_add_ids'], _m['forced_keep_ids']
+    total_budget_safe = _m['total_budget_safe']
+    weeks_schedule = _m['weeks_schedule']
+    transfers_limit_map = _m['transfers_limit_map']
+    captain_used_map = _m['captain_used_map']
+    play_wildcard, play_all_star_card, force_wc_on_day_1 = _m['play_wildcard'], _m['play_all_star_card'], _m['force_wc_on_day_1']
+    sim_game_day, extra_transfers = _m['sim_game_day'], _m['extra_transfers']
+    
+    team_player_idx = defaultdict(list)
+    for p_i, p in enumerate(players_data): team_player_idx[p['team']].append(p_i)
+    
+    prob = pulp.LpProblem("NBA_Fantasy_Opt", pulp.LpMaximize)
+    roster_vars = {} 
+    trans_in_vars = {}
+    starter_vars = {} 
+    captain_vars = {}
+
+    # Forced drops/keeps/adds are fixed through the roster variables' bounds rather than extra equality rows
+    forced_drop_set, forced_add_set = set(forced_drop_ids), set(forced_add_ids)
+    forced_keep_set = set(forced_keep_ids) & set(my_player_ids)
+    # Zero-EP and force-dropped players can't add to the objective, so they get no starter/captain variables.
+    # scheduled_by_day below is derived from the same mask, so it only lists players that have them.
+    can_score = np.array([p['ep'] > 0 and p['id'] not in forced_drop_set for p in players_data], dtype=bool)
+
+    for d_idx in range(num_future_days):
+        for p_i, p in enumerate(players_data):
+            pid = p['id']
+            r_low = 1 if pid in forced_keep_set or (d_idx == 0 and pid in forced_add_set) else 0
+            r_up = 0 if pid in forced_drop_set else 1
+            # LpInteger, since LpBinary would reset the bounds to 0..1
+            roster_vars[(pid, d_idx)] = pulp.LpVariable(f"R_{pid}_{d_idx}", r_low, r_up, pulp.LpInteger)
+            # T only enters transfer-count rows; with integral R, any count a binary T could reach is reachable here too
+            trans_in_vars[(pid, d_idx)] = pulp.LpVariable(f"T_{pid}_{d_idx}", 0, 1)
+            sched_prob = game_prob_mat[p_i, d_idx]
+            if sched_prob > 0 and can_score[p_i]:
+                starter_vars[(pid, d_idx)] = pulp.LpVariable(f"S_{pid}_{d_idx}", 0, 1, pulp.LpBinary)
+                # Continuous is enough: with binary starters, each week's captain polytope has integral vertices
+                captain_vars[(pid, d_idx)] = pulp.LpVariable(f"C_{pid}_{d_idx}", 0, 1)
+
+    for p in players_data:
+        pid = p['id']
+        is_owned = 1 if pid in my_player_ids else 0
+        prob += trans_in_vars[(pid, 0)] >= roster_vars[(pid, 0)] - is_owned
+        for d_idx in range(1, num_future_days):
+            prob += trans_in_vars[(pid, d_idx)] >= roster_vars[(pid, d_idx)] - roster_vars[(pid, d_idx-1)]
+
+    is_bc = [p['pos'] == "Back Court" for p in players_data]
+    costs = [p['cost'] for p in players_data]
+    scheduled_by_day = [np.flatnonzero((game_prob_mat[:, d_idx] > 0) & can_score).tolist() for d_idx in range(num_future_days)]
+    obj_terms = []
+
+    for d_idx in range(num_future_days):
+        # Resolve this day's variables once; every constraint below indexes into these lists
+        day_R = [roster_vars[(p['id'], d_idx)] for p in players_data]
+        prob += pulp.LpAffineExpression((r, 1) for r in day_R) == ROSTER_SIZE
+        prob += pulp.LpAffineExpression(zip(day_R, costs)) <= total_budget_safe
+        prob += pulp.LpAffineExpression((r, 1) for r, bc in zip(day_R, is_bc) if bc) == 5
+        prob += pulp.LpAffineExpression((r, 1) for r, bc in zip(day_R, is_bc) if not bc) == 5
+
+        for t, t_idx in team_player_idx.items():
+            prob += pulp.lpSum(day_R[p_i] for p_i in t_idx) <= MAX_PLAYERS_PER_TEAM
+
+        # Only players who can score this day have starter/captain variables
+        day_players = scheduled_by_day[d_idx]
+        if day_players:
+            day_S = [starter_vars[(players_data[p_i]['id'], d_idx)] for p_i in day_players]
+            prob += pulp.lpSum(day_S) <= 5
+            prob += pulp.lpSum(s for s, p_i in zip(day_S, day_players) if is_bc[p_i]) <= 3
+            prob += pulp.lpSum(s for s, p_i in zip(day_S, day_players) if not is_bc[p_i]) <= 3
+
+        for p_i in day_players:
+            p = players_data[p_i]
+            pid = p['id']
+            prob += starter_vars[(pid, d_idx)] <= roster_vars[(pid, d_idx)]
+            prob += captain_vars[(pid, d_idx)] <= starter_vars[(pid, d_idx)]
+            # Zero-value slots (no game, or an EP of 0) add nothing but dict churn to the objective
+            day_ep = p['ep'] * game_prob_mat[p_i, d_idx]
+            if day_ep > 0:
+                obj_terms.append((starter_vars[(pid, d_idx)], day_ep))
+                obj_terms.append((captain_vars[(pid, d_idx)], day_ep))
+
+    # Aggregated Constraints (Weekly)
+    for w_idx, w_data in enumerate(weeks_schedule):
+        gw_num = w_data['gw']
+        gw_events = w_data['events']
+        gw_indices = w_data['d_indices']
+
+        if gw_indices:
+            week_transfers_vars = []
+
+            # Wildcard is handled by unlimited transfers on Day 1 for the whole week's budget.
+            is_wildcard_week = (w_idx == 0 and play_wildcard)
+
+            # All Star Card gives unlimited transfers for Day 1 only, and then reverts.
+            is_all_star_day_1 = (w_idx == 0 and play_all_star_card)
+
+            for d_idx in gw_indices:
+                # Determine if this day is the specific "Wildcard" day
+                # Default logic: The wildcard day is the first future day (index 0 of this week's indices)
+                # unless "Force on Day 1" is unchecked, then use the offset.
+
+                wc_day_idx = -1
+                if is_wildcard_week:
+                    if force_wc_on_day_1:
+                        wc_day_idx = gw_indices[0]
+                    else:
+                        wc_day_idx = gw_indices[0] + (sim_game_day - 1)
+
+                # Transfers on the WC/All Star day do NOT count towards the standard weekly limit
+
+                is_exempt_day = False
+                if is_wildcard_week and d_idx == wc_day_idx:
+                    is_exempt_day = True
+                elif is_all_star_day_1 and d_idx == (gw_indices[0] + (sim_game_day - 1)):
+                     # Keeping ASC logic aligned with WC day choice if needed, though mostly deprecated
+                     is_exempt_day = True
+
+                if is_exempt_day:
+                    continue # Don't count transfers against the limit
+
+                day_trans_vars = [trans_in_vars[(p['id'], d_idx)] for p in players_data]
+                week_transfers_vars.extend(day_trans_vars)
+
+            # Limit applies to the sum of non-WC day transfers (which is the standard limit)
+            limit = transfers_limit_map[gw_num]
+
+            # Skip vacuous limits (e.g. every remaining day of the week is the Wildcard day)
+            if week_transfers_vars:
+                # Add purchased extra transfers to the first week's limit
+                if w_idx == 0:
+                    limit += extra_transfers
+                    # If extra transfers are enabled, force the solver to use the entire capacity (Base + Extra)
+                    if extra_transfers > 0:
+                        prob += pulp.lpSum(week_transfers_vars) == limit, f"TransLimit_GW{gw_num}"
+                    else:
+                        prob += pulp.lpSum(week_transfers_vars) <= limit, f"TransLimit_GW{gw_num}"
+                else:
+                    prob += pulp.lpSum(week_transfers_vars) <= limit, f"TransLimit_GW{gw_num}"
+
+            week_captains = []
+            for d_idx in gw_indices:
+                day_caps = [captain_vars[(p['id'], d_idx)] for p in players_data if (p['id'], d_idx) in captain_vars]
+                week_captains.extend(day_caps)
+
+            # No scheduled games left this week means no captain to pick (an empty "== 1" is infeasible)
+            if not week_captains: continue
+
+            if captain_used_map.get(gw_num, False):
+                prob += pulp.lpSum(week_captains) == 0
+            else:
+                # Every captain var has a positive EP, so the maximization fills this whenever it can
+                prob += pulp.lpSum(week_captains) <= 1
+
+    # One bulk construction instead of growing the expression term by term
+    prob += pulp.LpAffineExpression(obj_terms)
+    return {
+        'prob': prob, 'roster_vars': roster_vars, 'trans_in_vars': trans_in_vars,
+        'starter_vars': starter_vars, 'captain_vars': captain_vars, 'lock': threading.Lock()
+    }
 
 # --- ADMIN PAGE ---
 if st.query_params.get("admin") == "true":
@@ -290,22 +706,32 @@ if st.query_params.get("admin") == "true":
     
     if password == st.secrets["admin_password"]:
         st.success("Access Granted")
-        if st.button("Refresh Logs"): st.rerun()
+        if st.button("Refresh Logs"):
+            st.session_state.pop('log_pages', None)
+            st.rerun()
         if get_firestore_db(): st.caption("Source: Cloud")
         else: st.caption("Source: Local")
-        logs_df = get_all_logs()
+        logs_since = st.date_input("Show Logs Since", value=None, help="Leave empty to page through all logs.")
+        # Logs are loaded a page at a time and kept across reruns until refreshed or the date changes
+        if 'log_pages' not in st.session_state or st.session_state.get('log_pages_since') != logs_since:
+            first_page, st.session_state.last_log_cursor = get_logs_page(since=logs_since)
+            st.session_state.log_pages, st.session_state.log_pages_since = [first_page], logs_since
+        def load_more_logs():
+            next_page, st.session_state.last_log_cursor = get_logs_page(st.session_state.last_log_cursor, since=logs_since)
+            st.session_state.log_pages.append(next_page)
+        if st.session_state.last_log_cursor is not None: st.button("Load More Logs", on_click=load_more_logs)
+        logs_df = pd.concat(st.session_state.log_pages, ignore_index=True)
         if not logs_df.empty:
-            logs_df['date_group'] = logs_df['timestamp'].apply(lambda x: str(x)[:10] if x else "Unknown")
-            unique_dates = sorted(logs_df['date_group'].unique(), reverse=True)
+            # date_group is derived while loading (in SQL for the local DB); one groupby splits the days
+            day_groups = sorted(logs_df.groupby('date_group', sort=False), key=lambda g: g[0], reverse=True)
             st.markdown("### Log History")
-            for d in unique_dates:
-                day_logs = logs_df[logs_df['date_group'] == d]
+            for d, day_logs in day_groups:
                 count = len(day_logs)
-                with st.expander(f"📅 {d} ({count} logs)", expanded=(d == unique_dates[0])):
+                with st.expander(f"📅 {d} ({count} logs)", expanded=(d == day_groups[0][0])):
                     st.dataframe(day_logs[['timestamp', 'ip_address', 'location', 'team_id', 'gameweek', 'weeks_planned', 'user_options', 'status', 'duration_sec', 'error_msg', 'result_summary', 'transfers']], width='stretch', hide_index=True)
             st.markdown("---")
             csv = logs_df.to_csv(index=False)
-            st.download_button("Download All Logs CSV", csv, "nba_optimizer_logs.csv", "text/csv")
+            st.download_button("Download Loaded Logs CSV", csv, "nba_optimizer_logs.csv", "text/csv")
         else: st.info("No logs found.")
     elif password: st.error("Incorrect Password")
     st.stop()
@@ -319,6 +745,12 @@ st.markdown("Optimize lineup and transfers accounting for **Mid-Week Progress**
 # FIX: Move fetching inside the flow to avoid circular import issues upon module load
 # We use st.session_state to hold the fetched data across runs.
 
+if 'bootstrap_data' not in st.session_state or 'fixtures_data_df' not in st.session_state:
+    # Warm both cached fetches concurrently; the blocks below then read from the cache
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        ex.submit(fetch_bootstrap)
+        ex.submit(fetch_fixtures)
+
 if 'bootstrap_data' not in st.session_state:
     st.session_state.bootstrap_data = fetch_bootstrap()
     if not st.session_state.bootstrap_data:
@@ -334,30 +766,24 @@ bootstrap = st.session_state.bootstrap_data
 fixtures_data = st.session_state.fixtures_data_df
 
 
-elements = pd.DataFrame(bootstrap['elements'])
-teams = pd.DataFrame(bootstrap['teams'])
-element_types = pd.DataFrame(bootstrap['element_types'])
+# Bootstrap-derived frames and lookups only change with the session's bootstrap snapshot, so build them once per session
+if 'reference_data' not in st.session_state:
+    st.session_state.reference_data = build_reference_data(bootstrap)
+ref = st.session_state.reference_data
+elements, teams, active_players, phase_index = ref['elements'], ref['teams'], ref['active_players'], ref['phase_index']
+finished_event_ids = ref['finished_event_ids']
+now_cost_by_id, web_name_by_id, team_short_by_id = ref['now_cost_by_id'], ref['web_name_by_id'], ref['team_short_by_id']
+team_by_id, position_by_id = ref['team_by_id'], ref['position_by_id']
 
-team_map = pd.Series(teams.name.values, index=teams.id).to_dict()
-if 'short_name' in teams.columns:
-    team_short_map = pd.Series(teams.short_name.values, index=teams.id).to_dict()
-else:
-    team_short_map = pd.Series(teams.name.str[:3].str.upper().values, index=teams.id).to_dict()
-pos_map = pd.Series(element_types.singular_name.values, index=element_types.id).to_dict()
-
-elements['team_name'] = elements['team'].map(team_map)
-elements['team_short'] = elements['team'].map(team_short_map)
-elements['position_name'] = elements['element_type'].map(pos_map)
-elements['full_name'] = elements['first_name'] + " " + elements['second_name']
-
-active_players = elements[elements['status'] != 'u'].copy()
+# Fixture kickoff times are UTC, so "today" is the UTC date; computed once per rerun
+now_utc = datetime.now(timezone.utc)
+today_str = now_utc.strftime("%Y-%m-%d")
 
 # SIDEBAR
 with st.sidebar:
     st.header("Settings")
     
     # --- DEFAULT GAMEWEEK CALCULATION (FIXED LOGIC) ---
-    current_utc = datetime.now(timezone.utc)
     all_events = bootstrap['events']
     all_phases = bootstrap['phases']
     
@@ -367,7 +793,7 @@ with st.sidebar:
     for event in sorted_events:
         try:
             deadline_utc = datetime.strptime(event['deadline_time'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
-            if current_utc <= deadline_utc:
+            if now_utc <= deadline_utc:
                 active_event_id = event['id']
                 break
         except:
@@ -386,7 +812,7 @@ with st.sidebar:
         
         if target_phase:
             try:
-                match = re.search(r'Gameweek\s*(\d+)', target_phase['name'])
+                match = GAMEWEEK_RE.search(target_phase['name'])
                 if match:
                     auto_detected_gw = int(match.group(1))
                 else:
@@ -410,7 +836,7 @@ with st.sidebar:
             if gameweek_phases:
                 last_phase = max(gameweek_phases, key=lambda x: x['start_event'])
                 try:
-                    match = re.search(r'Gameweek\s*(\d+)', last_phase['name'])
+                    match = GAMEWEEK_RE.search(last_phase['name'])
                     if match:
                         auto_detected_gw = int(match.group(1)) + 1 
                     else:
@@ -496,6 +922,8 @@ with st.sidebar:
         help="Add extra transfers to the first week limit. 100 points will be deducted from the total score for each."
     )
     
+    use_fast_form = st.checkbox("Quick Form Estimate?", value=False, help="Use each player's form from the player list instead of downloading their last 5 games. Much faster, less precise. Your own and forced-in players always use their exact history.")
+    
     st.markdown("---")
     st.caption("Simulation Mode")
     
@@ -507,7 +935,7 @@ with st.sidebar:
     use_sim_mode = st.checkbox("Simulate specific Game Day?", value=st.session_state.default_sim)
     
     # Calculate Max Days for current GW input
-    gw_events_for_max = get_gameweek_event_range(bootstrap, gameweek_input)
+    gw_events_for_max = get_gameweek_event_range(phase_index, gameweek_input)
     max_days_in_gw = len(gw_events_for_max)
     if max_days_in_gw == 0:
         max_days_in_gw = 7 # Fallback
@@ -529,7 +957,7 @@ with st.sidebar:
     
     # --- ROSTER PRE-CALC FOR SELECTORS ---
     
-    gw_events_selected = get_gameweek_event_range(bootstrap, gameweek_input)
+    gw_events_selected = get_gameweek_event_range(phase_index, gameweek_input)
     
     roster_source_eid = None
     
@@ -543,13 +971,7 @@ with st.sidebar:
     if fixtures_data is not None and not fixtures_data.empty:
         fixtures = fixtures_data
         gw_fixtures = fixtures[fixtures['event'].isin(gw_events_selected)].copy()
-        event_dates = {}
-        today_str = datetime.utcnow().strftime("%Y-%m-%d")
-        
-        for eid in gw_events_selected:
-            f = gw_fixtures[gw_fixtures['event'] == eid]
-            if not f.empty: event_dates[eid] = f.iloc[0]['kickoff_time'][:10]
-            else: event_dates[eid] = "9999"
+        event_dates = build_event_dates(gw_fixtures, gw_events_selected, "9999")
         
         if use_sim_mode:
             split_idx = sim_game_day - 1
@@ -577,7 +999,7 @@ with st.sidebar:
     # Final fetch of the determined roster source
     my_team_data = None
     if roster_source_eid:
-        my_team_data = fetch_picks(team_id_input, event_id=roster_source_eid)
+        my_team_data = fetch_picks(team_id_input, roster_source_eid, finished_event_ids)
         
     # Final roster state initialization
     current_roster_names = {}
@@ -599,11 +1021,9 @@ with st.sidebar:
              pid = p['element']
              my_player_ids.append(pid) # Build the player ID list used later
              # FIX: Look up player in full elements dataframe (including 'u' players) to prevent key errors
-             p_row = elements.loc[elements['id'] == pid]
+             if pid not in now_cost_by_id: continue
              
-             if p_row.empty: continue
-             
-             now_cost = p_row['now_cost'].values[0]
+             now_cost = now_cost_by_id[pid]
              purchase_price = p.get('purchase_price', now_cost)
              sell_price = calculate_selling_price(purchase_price, now_cost)
              
@@ -611,15 +1031,13 @@ with st.sidebar:
              current_roster_liquidation_value += sell_price
              
              current_roster_ids_set.add(pid)
-             name = f"{p_row['web_name'].values[0]} ({p_row['team_short'].values[0]})"
+             name = f"{web_name_by_id[pid]} ({team_short_by_id[pid]})"
              current_roster_names[name] = pid
 
     
-    all_available_for_add = {}
-    for idx, row in active_players.iterrows():
-        if row['id'] not in current_roster_ids_set:
-            name_label = f"{row['web_name']} ({row['team_short']}) - {row['now_cost']/10}m"
-            all_available_for_add[name_label] = row['id']
+    avail = active_players[~active_players['id'].isin(current_roster_ids_set)]
+    add_labels = avail['web_name'] + " (" + avail['team_short'] + ") - " + (avail['now_cost'] / 10).astype(str) + "m"
+    all_available_for_add = dict(zip(add_labels, avail['id']))
 
     # ONLY SHOW PLAYERS CURRENTLY ON THE ROSTER FOR 'FORCE DROP'
     # We populate this list regardless of the fetch success state, but the error message above alerts user if the roster is invalid.
@@ -703,7 +1121,7 @@ if run_btn:
         
         for w in range(weeks_to_optimize):
             current_gw = gameweek_input + w
-            ev_range = get_gameweek_event_range(bootstrap, current_gw)
+            ev_range = get_gameweek_event_range(phase_index, current_gw)
             ev_range.sort()
             if not ev_range: break
             weeks_schedule.append({'gw': current_gw, 'events': ev_range})
@@ -716,14 +1134,9 @@ if run_btn:
         # Ensure fixtures_data is valid before filtering
         gw_fixtures = fixtures[fixtures['event'].isin(all_target_event_ids)].copy()
         
-        event_dates = {}
-        for eid in all_target_event_ids:
-            f = gw_fixtures[gw_fixtures['event'] == eid]
-            if not f.empty: event_dates[eid] = f.iloc[0]['kickoff_time'][:10]
-            else: event_dates[eid] = "Unknown"
+        event_dates = build_event_dates(gw_fixtures, all_target_event_ids, "Unknown")
 
         # 3. Identify Current State
-        today_str = datetime.utcnow().strftime("%Y-%m-%d")
         week1_events = weeks_schedule[0]['events']
         
         if use_sim_mode:
@@ -740,36 +1153,49 @@ if run_btn:
         if not future_event_ids: raise Exception("All selected gameweeks have concluded")
 
         event_id_to_solver_idx = {eid: i for i, eid in enumerate(future_event_ids)}
+        # Solver day indices of each week, resolved once for the model and the reports
+        for w_data in weeks_schedule:
+            w_data['d_indices'] = sorted(event_id_to_solver_idx[eid] for eid in w_data['events'] if eid in event_id_to_solver_idx)
+        past_event_set = frozenset(past_event_ids)
+        future_event_set = frozenset(future_event_ids)
         roster_source_event_id = past_event_ids[-1] if past_event_ids else week1_events[0] - 1
 
         # 4. Analyze History
-        banked_points_total = 0.0
-        banked_points_by_gw = {}
-        transfers_used_w1 = 0
-        past_day_stats = {} 
+        banked_points_by_gw = defaultdict(float)
         captain_used_map = {w['gw']: False for w in weeks_schedule}
+        past_day_stats = {}
+        transfers_used_w1 = 0
         
         if past_event_ids:
             status_text.text("Calculating banked points...")
-            for eid in past_event_ids:
-                data = fetch_picks(team_id_input, eid)
-                if data and 'entry_history' in data:
-                    raw_pts = data['entry_history'].get('points', 0)
-                    daily_pts = raw_pts / 10.0
-                    banked_points_total += daily_pts
-                    
-                    gw = event_to_gw_map.get(eid)
-                    if gw: banked_points_by_gw[gw] = banked_points_by_gw.get(gw, 0.0) + daily_pts
-                    
-                    if eid in week1_events:
-                        transfers_used_w1 += data['entry_history'].get('event_transfers', 0)
-                    
-                    if gw:
-                        for p in data['picks']:
-                            if p['is_captain'] and p['multiplier'] > 1:
-                                captain_used_map[gw] = True
-                                break
-                    past_day_stats[eid] = {'score': daily_pts, 'picks': data['picks']}
+            # The sidebar already fetched the roster source event this run; only fetch the rest
+            picks_by_eid = {roster_source_eid: my_team_data} if my_team_data and roster_source_eid in past_event_set else {}
+            to_fetch = [eid for eid in past_event_ids if eid not in picks_by_eid]
+            with ThreadPoolExecutor(max_workers=8) as ex:
+                picks_by_eid.update(zip(to_fetch, ex.map(lambda eid: fetch_picks(team_id_input, eid, finished_event_ids), to_fetch)))
+            picks_by_eid = {eid: picks_by_eid[eid] for eid in past_event_ids}
+            # Single pass over the days that have history; everything else is derived from it
+            past_day_stats = {eid: {'score': d['entry_history'].get('points', 0) / 10.0, 'picks': d['picks']}
+                              for eid, d in picks_by_eid.items() if d and 'entry_history' in d}
+            week1_set = set(week1_events)
+            for eid, stats in past_day_stats.items():
+                gw = event_to_gw_map.get(eid)
+                if not gw: continue
+                banked_points_by_gw[gw] += stats['score']
+                if not captain_used_map.get(gw) and any(p['is_captain'] and p['multiplier'] > 1 for p in stats['picks']):
+                    captain_used_map[gw] = True
+            transfers_used_w1 = sum(picks_by_eid[eid]['entry_history'].get('event_transfers', 0) for eid in past_day_stats if eid in week1_set)
+        banked_points_total = sum(stats['score'] for stats in past_day_stats.values())
+        
+        # Resolve every (player, date) score shown in the completed-day tables up front
+        score_lookup = {}
+        past_pick_pids = list({pick['element'] for stats in past_day_stats.values() for pick in stats['picks']})
+        with ThreadPoolExecutor(max_workers=20) as ex:
+            scores_by_pid = dict(zip(past_pick_pids, ex.map(lambda pid: get_player_scores_or_empty(pid, today_str), past_pick_pids)))
+        for eid, stats in past_day_stats.items():
+            date_label = event_dates.get(eid, '?')
+            for pick in stats['picks']:
+                score_lookup[(pick['element'], date_label)] = scores_by_pid[pick['element']].get(date_label, 0)
         
         transfers_limit_map = {}
         for i, w_data in enumerate(weeks_schedule):
@@ -832,28 +1258,41 @@ if run_btn:
             (candidates_df['status'] != 'u') | (candidates_df['id'].isin(my_player_ids))
         ]
         
-        player_eps = {}
+        # Only fetch form where it can matter: a doubtful player's average is never used, and a player
+        # with no minutes this season is treated like the two-DNP case (kept at 0.0 only if owned/forced)
+        chance_col = players_to_fetch['chance_of_playing_next_round']
+        raw_doubtful = chance_col.notna() & (chance_col < 50)
+        doubtful_mask = raw_doubtful & ~players_to_fetch['id'].isin(forced_keep_ids + forced_add_ids)
+        fetch_pids = list(players_to_fetch.loc[~doubtful_mask & (players_to_fetch['minutes'] > 0), 'id'])
         
-        owned_injured_pids = [] 
+        history_avgs = {}
+        if use_fast_form:
+            # Bootstrap form stands in for the last-5 average; only owned/forced players keep the exact fetch
+            exact_ids = set(my_player_ids) | set(forced_add_ids) | set(forced_keep_ids)
+            form_by_id = pd.to_numeric(players_to_fetch.set_index('id')['form'], errors='coerce').fillna(0.0)
+            history_avgs = {pid: float(form_by_id[pid]) for pid in fetch_pids if pid not in exact_ids}
+            fetch_pids = [pid for pid in fetch_pids if pid in exact_ids]
         
-        for i, (index, player) in enumerate(players_to_fetch.iterrows()):
-            if i % 20 == 0: progress_bar.progress(int((i / len(players_to_fetch)) * 90))
-            pid = player['id']
-            chance = player['chance_of_playing_next_round']
-            is_doubtful = False
-            
-            if pd.notna(chance) and chance < 50: 
-                is_doubtful = True
-                if pid in my_player_ids:
-                    owned_injured_pids.append(pid)
-            
-            if pid in forced_keep_ids or pid in forced_add_ids: is_doubtful = False
-
-            avg = get_player_history_avg(pid)
-            if avg is None or is_doubtful:
-                if pid in my_player_ids or pid in forced_add_ids: avg = 0.0
-                else: continue
-            player_eps[pid] = avg
+        # Fetch recent-form averages concurrently; the progress bar is driven from this thread
+        with ThreadPoolExecutor(max_workers=20) as ex:
+            futures = {ex.submit(get_player_history_avg, pid, today_str): pid for pid in fetch_pids}
+            last_tick = time.time()
+            for i, fut in enumerate(as_completed(futures)):
+                # A failed fetch counts as 0.0 for this run only; the error isn't cached
+                try: history_avgs[futures[fut]] = fut.result()
+                except requests.exceptions.RequestException: history_avgs[futures[fut]] = 0.0
+                # Each progress() call is a websocket message, so cap updates at ~2 Hz
+                if time.time() - last_tick > 0.5:
+                    progress_bar.progress(int((i / len(fetch_pids)) * 90))
+                    last_tick = time.time()
+        
+        # Keep/drop rules as masks: doubtful or inactive (None avg) players only stay at 0.0 if owned or forced in
+        ids = players_to_fetch['id']
+        owned_injured_pids = ids[raw_doubtful & ids.isin(my_player_ids)].tolist()
+        avgs = ids.map(history_avgs)
+        zeroed = avgs.isna() | doubtful_mask
+        keep = ~zeroed | ids.isin(my_player_ids + forced_add_ids)
+        player_eps = dict(zip(ids[keep].tolist(), avgs.where(~zeroed, 0.0)[keep].tolist()))
 
         # 7. Optimization
         progress_bar.progress(95)
@@ -863,38 +1302,74 @@ if run_btn:
         
         players_data = []
         for pid, ep in player_eps.items():
-            p_row = elements[elements['id'] == pid].iloc[0]
-            pos = p_row['position_name']
+            pos = position_by_id[pid]
             simple_pos = "Back Court" if ("Guard" in pos or "Back" in pos) else "Front Court"
-            effective_cost = my_selling_prices.get(pid, p_row['now_cost'])
+            effective_cost = my_selling_prices.get(pid, now_cost_by_id[pid])
             
             players_data.append({
-                'id': pid, 'name': p_row['web_name'], 'team_short': p_row['team_short'],
-                'cost': effective_cost, 'current_val': p_row['now_cost'],
-                'pos': simple_pos, 'team': p_row['team'], 'ep': ep
+                'id': pid, 'name': web_name_by_id[pid], 'team_short': team_short_by_id[pid],
+                'cost': effective_cost, 'current_val': now_cost_by_id[pid],
+                'pos': simple_pos, 'team': team_by_id[pid], 'ep': ep
             })
+        players_by_id = {p['id']: p for p in players_data}
         
         # --- NBA CUP LOGIC ---
         # NOTE: Removed probability estimation as schedule is assumed finalized
         # and covered by the general scheduling loop below.
-        cup_team_map = {}
         target_teams = ["MIA", "ORL", "NYK", "TOR", "PHX", "OKC", "SAS", "LAL"]
-        for t_code in target_teams:
-            row = teams[teams['short_name'] == t_code]
-            if not row.empty: cup_team_map[t_code] = row.iloc[0]['id']
+        team_id_by_short = dict(zip(teams['short_name'][::-1], teams['id'][::-1])) # reversed so the first match wins
+        cup_team_map = {t_code: team_id_by_short[t_code] for t_code in target_teams if t_code in team_id_by_short}
+        
+        num_future_days = len(future_event_ids)
         
-        player_schedule = {p['id']: {} for p in players_data}
-        for _, f in gw_fixtures.iterrows():
-            eid = f['event']
-            if eid in event_id_to_solver_idx:
-                day_idx = event_id_to_solver_idx[eid]
-                for p in players_data:
-                    if p['team'] == f['team_h'] or p['team'] == f['team_a']:
-                        player_schedule[p['id']][day_idx] = 1.0 # Probability is 1.0 (Scheduled game)
+        # Dense (player, day) game-probability matrix shared by the model build and the results view.
+        # One (event, team) row per side of each fixture, joined to players by team.
+        game_prob_mat = np.zeros((len(players_data), num_future_days))
+        teams_long = pd.concat([
+            gw_fixtures[['event', 'team_h']].rename(columns={'team_h': 'team'}),
+            gw_fixtures[['event', 'team_a']].rename(columns={'team_a': 'team'})
+        ])
+        teams_long['d_idx'] = teams_long['event'].map(event_id_to_solver_idx)
+        teams_long = teams_long.dropna(subset=['d_idx'])
+        players_team_df = pd.DataFrame({'p_idx': np.arange(len(players_data)), 'team': [p['team'] for p in players_data]})
+        sched = teams_long.merge(players_team_df, on='team')
+        game_prob_mat[sched['p_idx'].to_numpy(), sched['d_idx'].to_numpy(dtype=int)] = 1.0 # Probability is 1.0 (Scheduled game)
         
         # Old semi-final/final logic removed. If these events are scheduled, they are covered above.
         
-        num_future_days = len(future_event_ids)
+        # Drop anyone who can't fit the budget even next to the nine cheapest players; owned/forced ones always stay.
+        # Players without a game stay too: they can't score (no starter/captain vars) but are valid cheap fillers.
+        # players_by_id keeps everyone for the transfer display.
+        must_keep_ids = set(my_player_ids) | set(forced_drop_ids) | set(forced_add_ids) | set(forced_keep_ids)
+        costs = np.array([p['cost'] for p in players_data], dtype=float)
+        affordable = costs + np.sort(costs)[:ROSTER_SIZE - 1].sum() <= total_budget_safe
+        in_model = affordable | np.array([p['id'] in must_keep_ids for p in players_data], dtype=bool)
+        players_data = [p for p, keep in zip(players_data, in_model) if keep]
+        game_prob_mat = game_prob_mat[in_model]
+        player_idx = {p['id']: i for i, p in enumerate(players_data)}
+        
+        # Warm start: holding the current roster with a greedy lineup is feasible unless a transfer is forced
+        use_warm_start = not forced_drop_ids and not forced_add_ids and extra_transfers == 0
+        my_player_set = set(my_player_ids)
+        warm_starters = greedy_starters(
+            np.array([p['ep'] for p in players_data], dtype=float), game_prob_mat,
+            np.array([p['pos'] == "Back Court" for p in players_data]),
+            np.array([p['id'] in my_player_set for p in players_data])
+        )
+        
+        # Everything the MIP depends on; identical inputs reuse the cached model across reruns and sessions
+        model_inputs = {
+            'players_data': players_data, 'game_prob_mat': game_prob_mat,
+            'my_player_ids': my_player_ids, 'forced_drop_ids': forced_drop_ids,
+            'forced_add_ids': forced_add_ids, 'forced_keep_ids': forced_keep_ids,
+            'total_budget_safe': total_budget_safe, 'weeks_schedule': weeks_schedule,
+            'event_id_to_solver_idx': event_id_to_solver_idx, 'transfers_limit_map': transfers_limit_map,
+            'captain_used_map': captain_used_map, 'play_wildcard': play_wildcard,
+            'play_all_star_card': play_all_star_card, 'force_wc_on_day_1': force_wc_on_day_1,
+            'sim_game_day': sim_game_day, 'extra_transfers': extra_transfers
+        }
+        model_key = hashlib.blake2b(repr({**model_inputs, 'game_prob_mat': game_prob_mat.tolist()}).encode(), digest_size=16).hexdigest()
+        
         previous_solutions_constraints = []
         
         # Determine loop count based on Quick Sim
@@ -906,162 +1381,44 @@ if run_btn:
         
         for opt_idx in range(loop_count):
             status_text.text(f"Calculating Option {opt_idx + 1}...")
-            prob = pulp.LpProblem(f"NBA_Fantasy_Opt_{opt_idx}", pulp.LpMaximize)
-            roster_vars = {} 
-            trans_in_vars = {}
-            starter_vars = {} 
-            captain_vars = {}
-            
-            for d_idx in range(num_future_days):
-                for p in players_data:
-                    pid = p['id']
-                    roster_vars[(pid, d_idx)] = pulp.LpVariable(f"R_{pid}_{d_idx}", 0, 1, pulp.LpBinary)
-                    trans_in_vars[(pid, d_idx)] = pulp.LpVariable(f"T_{pid}_{d_idx}", 0, 1, pulp.LpBinary)
-                    sched_prob = player_schedule[pid].get(d_idx, 0)
-                    if sched_prob > 0:
-                        starter_vars[(pid, d_idx)] = pulp.LpVariable(f"S_{pid}_{d_idx}", 0, 1, pulp.LpBinary)
-                        captain_vars[(pid, d_idx)] = pulp.LpVariable(f"C_{pid}_{d_idx}", 0, 1, pulp.LpBinary)
-
-            for p in players_data:
-                pid = p['id']
-                is_owned = 1 if pid in my_player_ids else 0
-                prob += trans_in_vars[(pid, 0)] >= roster_vars[(pid, 0)] - is_owned
-                for d_idx in range(1, num_future_days):
-                    prob += trans_in_vars[(pid, d_idx)] >= roster_vars[(pid, d_idx)] - roster_vars[(pid, d_idx-1)]
-
-            for pid in forced_drop_ids:
-                for d_idx in range(num_future_days):
-                    if (pid, d_idx) in roster_vars: prob += roster_vars[(pid, d_idx)] == 0
-
-            for pid in forced_add_ids:
-                if (pid, 0) in roster_vars: prob += roster_vars[(pid, 0)] == 1
-            
-            for pid in forced_keep_ids:
-                if pid in my_player_ids:
-                    for d_idx in range(num_future_days):
-                        if (pid, d_idx) in roster_vars: prob += roster_vars[(pid, d_idx)] == 1
-
-            teams_list = elements['team'].unique()
-            bc_players = [p for p in players_data if p['pos'] == "Back Court"]
-            fc_players = [p for p in players_data if p['pos'] == "Front Court"]
-            total_obj = 0
+            model = build_lp_model(model_key, model_inputs)
+            roster_vars, trans_in_vars = model['roster_vars'], model['trans_in_vars']
+            starter_vars, captain_vars = model['starter_vars'], model['captain_vars']
             
-            for d_idx in range(num_future_days):
-                prob += pulp.lpSum([roster_vars[(p['id'], d_idx)] for p in players_data]) == ROSTER_SIZE
-                prob += pulp.lpSum([roster_vars[(p['id'], d_idx)] * p['cost'] for p in players_data]) <= total_budget_safe
-                prob += pulp.lpSum([roster_vars[(p['id'], d_idx)] for p in bc_players]) == 5
-                prob += pulp.lpSum([roster_vars[(p['id'], d_idx)] for p in fc_players]) == 5
+            with model['lock']:
+                prob = model['prob'].copy()
+                for prev_sol_roster in previous_solutions_constraints:
+                    prob += pulp.lpSum([roster_vars[(pid, d)] for pid, d in prev_sol_roster]) <= len(prev_sol_roster) - 1
                 
-                for t in teams_list:
-                    t_players = [p for p in players_data if p['team'] == t]
-                    prob += pulp.lpSum([roster_vars[(p['id'], d_idx)] for p in t_players]) <= MAX_PLAYERS_PER_TEAM
-
-                day_starters = [starter_vars[(p['id'], d_idx)] for p in players_data if (p['id'], d_idx) in starter_vars]
-                if day_starters:
-                    prob += pulp.lpSum(day_starters) <= 5
-                    day_bc = [starter_vars[(p['id'], d_idx)] for p in bc_players if (p['id'], d_idx) in starter_vars]
-                    day_fc = [starter_vars[(p['id'], d_idx)] for p in fc_players if (p['id'], d_idx) in starter_vars]
-                    prob += pulp.lpSum(day_bc) <= 3
-                    prob += pulp.lpSum(day_fc) <= 3
-                    
-                for p in players_data:
-                    pid = p['id']
-                    if (pid, d_idx) in starter_vars:
-                        prob += starter_vars[(pid, d_idx)] <= roster_vars[(pid, d_idx)]
-                        prob += captain_vars[(pid, d_idx)] <= starter_vars[(pid, d_idx)]
-                        total_obj += starter_vars[(pid, d_idx)] * p['ep']
-                        total_obj += captain_vars[(pid, d_idx)] * p['ep']
-
-            # Aggregated Constraints (Weekly)
-            for w_idx, w_data in enumerate(weeks_schedule):
-                gw_num = w_data['gw']
-                gw_events = w_data['events']
-                gw_indices = [event_id_to_solver_idx[eid] for eid in w_data['events'] if eid in event_id_to_solver_idx]
+                if use_warm_start:
+                    for (pid, d_idx), var in roster_vars.items(): var.setInitialValue(1 if pid in my_player_set else 0)
+                    for var in trans_in_vars.values(): var.setInitialValue(0)
+                    for (pid, d_idx), var in starter_vars.items(): var.setInitialValue(1 if warm_starters[player_idx[pid], d_idx] else 0)
+                    for var in captain_vars.values(): var.setInitialValue(0)
+                    for w_data in weeks_schedule:
+                        if captain_used_map.get(w_data['gw'], False): continue
+                        week_days = w_data['d_indices']
+                        best = max(((players_data[p_i]['ep'], p_i, d_idx) for d_idx in week_days for p_i in np.flatnonzero(warm_starters[:, d_idx])), default=None)
+                        if best and best[0] > 0: captain_vars[(players_data[best[1]]['id'], best[2])].setInitialValue(1)
                 
-                if gw_indices:
-                    week_transfers_vars = []
-                    
-                    # Wildcard is handled by unlimited transfers on Day 1 for the whole week's budget.
-                    is_wildcard_week = (w_idx == 0 and play_wildcard)
-                    
-                    # All Star Card gives unlimited transfers for Day 1 only, and then reverts.
-                    is_all_star_day_1 = (w_idx == 0 and play_all_star_card)
-                    
-                    gw_indices.sort()
-                    
-                    for d_idx in gw_indices:
-                        # Determine if this day is the specific "Wildcard" day
-                        # Default logic: The wildcard day is the first future day (index 0 of this week's indices)
-                        # unless "Force on Day 1" is unchecked, then use the offset.
-                        
-                        wc_day_idx = -1
-                        if is_wildcard_week:
-                            if force_wc_on_day_1:
-                                wc_day_idx = gw_indices[0]
-                            else:
-                                wc_day_idx = gw_indices[0] + (sim_game_day - 1)
-                        
-                        # Transfers on the WC/All Star day do NOT count towards the standard weekly limit
-                        
-                        is_exempt_day = False
-                        if is_wildcard_week and d_idx == wc_day_idx:
-                            is_exempt_day = True
-                        elif is_all_star_day_1 and d_idx == (gw_indices[0] + (sim_game_day - 1)):
-                             # Keeping ASC logic aligned with WC day choice if needed, though mostly deprecated
-                             is_exempt_day = True
-
-                        if is_exempt_day:
-                            continue # Don't count transfers against the limit
-                            
-                        day_trans_vars = [trans_in_vars[(p['id'], d_idx)] for p in players_data]
-                        week_transfers_vars.extend(day_trans_vars)
-                    
-                    # Limit applies to the sum of non-WC day transfers (which is the standard limit)
-                    limit = transfers_limit_map[gw_num]
-                    
-                    # Add purchased extra transfers to the first week's limit
-                    if w_idx == 0:
-                        limit += extra_transfers
-                        # If extra transfers are enabled, force the solver to use the entire capacity (Base + Extra)
-                        if extra_transfers > 0:
-                            prob += pulp.lpSum(week_transfers_vars) == limit, f"TransLimit_GW{gw_num}"
-                        else:
-                            prob += pulp.lpSum(week_transfers_vars) <= limit, f"TransLimit_GW{gw_num}"
-                    else:
-                        prob += pulp.lpSum(week_transfers_vars) <= limit, f"TransLimit_GW{gw_num}"
-                    
-                    week_captains = []
-                    for d_idx in gw_indices:
-                        day_caps = [captain_vars[(p['id'], d_idx)] for p in players_data if (p['id'], d_idx) in captain_vars]
-                        week_captains.extend(day_caps)
-                    
-                    if captain_used_map.get(gw_num, False):
-                        prob += pulp.lpSum(week_captains) == 0
-                    else:
-                        prob += pulp.lpSum(week_captains) == 1
-
-            for prev_sol_roster in previous_solutions_constraints:
-                prob += pulp.lpSum([roster_vars[(pid, d)] for pid, d in prev_sol_roster]) <= len(prev_sol_roster) - 1
-
-            prob += total_obj
-            prob.solve(pulp.PULP_CBC_CMD(msg=0))
-            
-            if pulp.LpStatus[prob.status] != 'Optimal':
-                # Reverted: Use simplified error message on solver failure
-                status_message = pulp.LpStatus[prob.status]
-                with option_tabs[opt_idx]: st.warning(f"Optimization failed: Solver returned status code {status_message}. Check constraints (Budget/Roster Size/Transfers).")
+                prob.solve(get_solver(warm_start=use_warm_start))
                 
-                # If we are here, we throw an exception to be caught and logged
-                raise Exception(f"Solver failed with status: {status_message}. Check constraints.")
+                if pulp.LpStatus[prob.status] != 'Optimal':
+                    # Reverted: Use simplified error message on solver failure
+                    status_message = pulp.LpStatus[prob.status]
+                    with option_tabs[opt_idx]: st.warning(f"Optimization failed: Solver returned status code {status_message}. Check constraints (Budget/Roster Size/Transfers).")
                 
-            current_sol_roster = []
-            for d_idx in range(num_future_days):
-                for p in players_data:
-                    if roster_vars[(p['id'], d_idx)].varValue > 0.5:
-                        current_sol_roster.append((p['id'], d_idx))
-            previous_solutions_constraints.append(current_sol_roster)
-            
-            future_proj = pulp.value(prob.objective) / 10
+                    # If we are here, we throw an exception to be caught and logged
+                    raise Exception(f"Solver failed with status: {status_message}. Check constraints.")
+                
+                roster_mat = solution_matrix(roster_vars, player_idx, num_future_days)
+                starter_mat = solution_matrix(starter_vars, player_idx, num_future_days)
+                captain_mat = captain_matrix(captain_vars, player_idx, num_future_days, [w['d_indices'] for w in weeks_schedule])
+                
+                current_sol_roster = [(players_data[i]['id'], int(d_idx)) for d_idx, i in zip(*np.nonzero(roster_mat))]
+                previous_solutions_constraints.append(current_sol_roster)
+                
+                future_proj = pulp.value(prob.objective) / 10
             transfer_cost = extra_transfers * 100
             total_proj = banked_points_total + future_proj - transfer_cost
             if opt_idx == 0: best_total_score = total_proj
@@ -1073,12 +1430,11 @@ if run_btn:
                 for eid in w_data['events']:
                     if eid in event_id_to_solver_idx:
                         d_idx = event_id_to_solver_idx[eid]
-                        for p in players_data:
-                            if (p['id'], d_idx) in starter_vars and starter_vars[(p['id'], d_idx)].varValue > 0.5:
-                                pts = p['ep'] / 10.0
-                                if (p['id'], d_idx) in captain_vars and captain_vars[(p['id'], d_idx)].varValue > 0.5:
-                                    pts *= 2
-                                gw_total += pts
+                        for i in np.flatnonzero(starter_mat[d_idx]):
+                            pts = players_data[i]['ep'] / 10.0
+                            if captain_mat[d_idx, i]:
+                                pts *= 2
+                            gw_total += pts
                 gw_breakdown[gw] = gw_total
 
             with option_tabs[opt_idx]:
@@ -1090,13 +1446,14 @@ if run_btn:
                 previous_roster_ids = set(my_player_ids)
                 
                 # Get the permanent pre-GW roster IDs for All Star Reversion check
-                pre_gw_data = fetch_picks(team_id_input, pre_gw_start_eid)
+                pre_gw_data = fetch_picks(team_id_input, pre_gw_start_eid, finished_event_ids)
                 pre_gw_permanent_ids = set(p['element'] for p in pre_gw_data['picks'])
                 
                 for w_data in weeks_schedule:
                     gw_num = w_data['gw']
                     gw_events = w_data['events']
-                    if not any(e in past_event_ids or e in future_event_ids for e in gw_events): continue
+                    gw_event_set = set(gw_events)
+                    if not (gw_event_set & past_event_set) and not (gw_event_set & future_event_set): continue
                     
                     with st.expander(f"Gameweek {gw_num}", expanded=(gw_num == gameweek_input)):
                         day_tabs = st.tabs([f"Day {i+1}" for i in range(len(gw_events))])
@@ -1114,10 +1471,10 @@ if run_btn:
                                 # 1. Get solved roster for the day
                                 if eid in event_id_to_solver_idx:
                                     d_idx = event_id_to_solver_idx[eid]
-                                    for p in players_data:
-                                        if roster_vars[(p['id'], d_idx)].varValue > 0.5:
-                                            roster_ids.add(p['id'])
-                                            roster_today.append(p)
+                                    for p_i in np.flatnonzero(roster_mat[d_idx]):
+                                        p = players_data[p_i]
+                                        roster_ids.add(p['id'])
+                                        roster_today.append(p)
                                 elif eid in past_day_stats:
                                     roster_ids = set(p['element'] for p in past_day_stats[eid]['picks'])
                                     roster_to_display = [p for p in players_data if p['id'] in roster_ids]
@@ -1135,27 +1492,29 @@ if run_btn:
                                 trans_out = previous_roster_ids - roster_ids
                                 
                                 
-                                if eid in past_event_ids:
+                                if eid in past_event_set:
                                     date_label = event_dates.get(eid, '?')
                                     st.caption(f"Status: COMPLETED | Date: {date_label}")
                                     if eid in past_day_stats:
                                         stats = past_day_stats[eid]
                                         st.metric("Score", f"{stats['score']:.1f}")
-                                        r_list = []
-                                        for pick in stats['picks']:
-                                            pid = pick['element']
-                                            p_row = active_players.loc[active_players['id'] == pid]
-                                            name = p_row['web_name'].values[0] if not p_row.empty else "Unknown"
-                                            team_short = p_row['team_short'].values[0] if not p_row.empty else "-"
-                                            role = "Starter"
-                                            if pick['multiplier'] == 0: role = "Bench"
-                                            if pick['is_captain'] and pick['multiplier'] > 1: role = "CAPTAIN ⭐"
-                                            actual_pts = get_player_score_for_date(pid, date_label)
-                                            r_list.append({"Name": name, "Team": team_short, "Role": role, "Score": f"{actual_pts/10:.1f}"})
-                                        st.dataframe(pd.DataFrame(r_list), width='stretch', hide_index=True)
+                                        if not stats['picks']: st.info("No picks.")
+                                        else:
+                                            picks_df = pd.DataFrame(stats['picks'], columns=['element', 'multiplier', 'is_captain'])
+                                            picks_df = picks_df.merge(active_players[['id', 'web_name', 'team_short']], left_on='element', right_on='id', how='left')
+                                            roles = np.where(picks_df['is_captain'].astype(bool) & (picks_df['multiplier'] > 1), "CAPTAIN ⭐",
+                                                             np.where(picks_df['multiplier'] == 0, "Bench", "Starter"))
+                                            actual_pts = picks_df['element'].map(lambda pid: score_lookup.get((pid, date_label), 0))
+                                            r_df = pd.DataFrame({
+                                                "Name": picks_df['web_name'].fillna("Unknown"),
+                                                "Team": picks_df['team_short'].fillna("-"),
+                                                "Role": roles,
+                                                "Score": (actual_pts / 10).map("{:.1f}".format)
+                                            })
+                                            st.dataframe(r_df, width='stretch', hide_index=True)
                                     else: st.info("No data.")
                                 
-                                elif eid in future_event_ids:
+                                elif eid in future_event_set:
                                     d_idx = event_id_to_solver_idx[eid]
                                     
                                     # Special handling for All Star Card transfer display
@@ -1169,12 +1528,12 @@ if run_btn:
                                              t_out = []
                                              t_in = []
                                              for pid in trans_out:
-                                                p_obj = next((x for x in players_data if x['id'] == pid), None)
+                                                p_obj = players_by_id.get(pid)
                                                 if p_obj:
                                                     st.error(f"OUT: {p_obj['name']}")
                                                     t_out.append(p_obj['name'])
                                              for pid in trans_in:
-                                                p_obj = next(x for x in players_data if x['id'] == pid)
+                                                p_obj = players_by_id[pid]
                                                 st.success(f"IN: {p_obj['name']}")
                                                 t_in.append(p_obj['name'])
                                         
@@ -1183,12 +1542,12 @@ if run_btn:
                                         t_out = []
                                         t_in = []
                                         for pid in trans_out:
-                                            p_obj = next((x for x in players_data if x['id'] == pid), None)
+                                            p_obj = players_by_id.get(pid)
                                             if p_obj:
                                                 st.error(f"OUT: {p_obj['name']}")
                                                 t_out.append(p_obj['name'])
                                         for pid in trans_in:
-                                            p_obj = next(x for x in players_data if x['id'] == pid)
+                                            p_obj = players_by_id[pid]
                                             st.success(f"IN: {p_obj['name']}")
                                             t_in.append(p_obj['name'])
                                         
@@ -1205,14 +1564,14 @@ if run_btn:
                                         status = "Bench"
                                         points = 0.0
                                         
-                                        game_prob = player_schedule[p['id']].get(d_idx, 0)
+                                        game_prob = game_prob_mat[player_idx[pid], d_idx]
                                         
                                         # Only determine role and points if it's the standard solution (Day 1 ASC or standard week)
                                         if not is_all_star_reversion_day:
-                                            if (pid, d_idx) in starter_vars and starter_vars[(pid, d_idx)].varValue > 0.5:
+                                            if starter_mat[d_idx, player_idx[pid]]:
                                                 status = "Starter"
                                                 points = (p['ep'] / 10.0) * game_prob
-                                                if (pid, d_idx) in captain_vars and captain_vars[(p['id'], d_idx)].varValue > 0.5:
+                                                if captain_mat[d_idx, player_idx[pid]]:
                                                     status = "CAPTAIN ⭐"
                                                     points *= 2
                                             elif game_prob == 0: status = "No Game"
@@ -1225,16 +1584,11 @@ if run_btn:
                                         if 0 < game_prob < 1:
                                             note = f" ({int(game_prob*100)}% chance)"
                                             
-                                        l_data.append({
-                                            "Name": p['name'], "Team": p['team_short'],
-                                            "Pos": p['pos'], "Value": f"{p['current_val']/10}m",
-                                            "Role": status, "Exp Pts": f"{points:.1f}{note}"
-                                        })
+                                        l_data.append((p['name'], p['team_short'], p['pos'], f"{p['current_val']/10}m", status, f"{points:.1f}{note}"))
                                     
-                                    df = pd.DataFrame(l_data)
                                     role_order = {"CAPTAIN ⭐": 0, "Starter": 1, "Permanent Roster": 2, "Bench": 3, "No Game": 4}
-                                    df['sort'] = df['Role'].map(role_order)
-                                    st.dataframe(df.sort_values('sort').drop('sort', axis=1), width='stretch', hide_index=True)
+                                    l_data.sort(key=lambda r: role_order.get(r[4], 99)) # stable, so ties keep roster order
+                                    st.dataframe(pd.DataFrame(l_data, columns=["Name", "Team", "Pos", "Value", "Role", "Exp Pts"]), width='stretch', hide_index=True)
 
         transfers_str = "; ".join(best_option_transfers)
         